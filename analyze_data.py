@@ -1,6 +1,97 @@
 import pandas as pd
 import numpy as np
 import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pv
+
+# The portal mixes full timestamps and bare dates within the same column
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+# Anything else in a coordinate column is treated as missing, like pd.to_numeric(errors='coerce')
+NUMBER_PATTERN = r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'
+# Only these columns are used downstream; the rest of the file is never tokenized
+NEEDED_COLS = ['registrationID', 'registrationDate', 'executionDate', 'district', 'category', 'latitude', 'longitude']
+# Declared column types, so the reader does no inference. Dates and coordinates are read
+# as plain text and converted explicitly later; low-cardinality text is dictionary-encoded
+# while parsing and arrives in pandas as 'category'.
+COLUMN_TYPES = {
+    'registrationID': pa.uint32(),
+    'registrationDate': pa.string(),
+    'executionDate': pa.string(),
+    'district': pa.dictionary(pa.int32(), pa.string()),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'latitude': pa.string(),
+    'longitude': pa.string()
+}
+
+# Lviv's six districts (same list as the Streamlit form); anything else is lumped into OTHER_LABEL
+DISTRICTS = ["Галицький район", "Залізничний район", "Личаківський район", "Сихівський район", "Франківський район", "Шевченківський район"]
+OTHER_LABEL = '__OTHER__'
+DISTRICT_DTYPE = pd.CategoricalDtype(categories=DISTRICTS + [OTHER_LABEL], ordered=False)
+
+# Candidate dtypes for downcasting, smallest first, with the range each can hold
+UINT_RANGES = [(t, np.iinfo(t).min, np.iinfo(t).max) for t in (np.uint8, np.uint16, np.uint32)]
+INT_RANGES = [(t, np.iinfo(t).min, np.iinfo(t).max) for t in (np.int8, np.int16, np.int32)]
+FLOAT_RANGES = [(np.float32, np.finfo(np.float32).min, np.finfo(np.float32).max)]
+
+def parse_timestamps(arr):
+    """
+    Parses an Arrow string column against DATE_FORMATS in order.
+    Values matching none of the formats become null.
+    """
+    return pc.coalesce(*(pc.strptime(arr, format=fmt, unit='s', error_is_null=True) for fmt in DATE_FORMATS))
+
+def parse_coordinates(arr):
+    """
+    Converts an Arrow string column of coordinates to float32, accepting
+    both ',' and '.' as the decimal separator. Invalid values become null.
+    """
+    arr = pc.replace_substring(arr, ',', '.')
+    try:
+        # Clean columns convert in one cast, without the regex scan
+        return pc.cast(arr, pa.float32())
+    except pa.ArrowInvalid:
+        valid = pc.match_substring_regex(arr, NUMBER_PATTERN)
+        return pc.cast(pc.if_else(valid, arr, pa.scalar(None, pa.string())), pa.float32())
+
+def recode_categories(series, dtype):
+    """
+    Moves a categorical column onto a fixed CategoricalDtype by remapping its
+    few categories rather than re-hashing every row. Categories missing from
+    the dtype map to OTHER_LABEL.
+    """
+    known = set(dtype.categories)
+    lookup = np.array(
+        [dtype.categories.get_loc(c if c in known else OTHER_LABEL) for c in series.cat.categories] + [-1],
+        dtype=np.int32
+    )
+    # Missing values have code -1, which picks the trailing -1 sentinel from the lookup
+    codes = lookup[series.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name)
+
+def downcast_numeric(series):
+    """
+    Casts a numeric column to the smallest dtype that holds its min/max,
+    preferring unsigned integers for non-negative data.
+    """
+    arr = series.to_numpy()
+    if arr.size == 0:
+        return series
+
+    if arr.dtype.kind in 'iu':
+        mn, mx = arr.min(), arr.max()
+        candidates = UINT_RANGES if mn >= 0 else INT_RANGES
+    else:
+        if np.isnan(arr).all():
+            return series
+        mn, mx = np.nanmin(arr), np.nanmax(arr)
+        candidates = FLOAT_RANGES
+
+    for target, lo, hi in candidates:
+        if lo <= mn and mx <= hi:
+            return pd.Series(arr.astype(target, copy=False), index=series.index, name=series.name)
+    return series
 
 def analyze_and_optimize():
     """
@@ -8,71 +99,77 @@ def analyze_and_optimize():
     """
     input_file = 'data/glm_all_2024_portal.csv'
     output_sample_file = 'data/sample_optimized.csv'
+    output_parquet_file = 'data/sample_optimized.parquet'
 
     if not os.path.exists(input_file):
         print(f"Error: Input file not found at {input_file}")
         return
 
-    print(f"Loading data from {input_file}...")
+    print(f"Streaming data from {input_file}...")
     try:
-        df = pd.read_csv(input_file, sep=';', low_memory=False)
+        reader = pv.open_csv(
+            input_file,
+            read_options=pv.ReadOptions(block_size=32 << 20, use_threads=True),
+            parse_options=pv.ParseOptions(delimiter=';'),
+            convert_options=pv.ConvertOptions(
+                # The portal writes missing values as 'null', which pandas also treated as NaN
+                strings_can_be_null=True,
+                # Missing columns make open_csv raise, which is reported below
+                include_columns=NEEDED_COLS,
+                column_types=COLUMN_TYPES
+            )
+        )
     except Exception as e:
         print(f"Error loading CSV: {e}")
         return
 
+    # --- Steps 2-5: Parse Dates and Coordinates, Calculate Target and Filter per Batch ---
+    # Only the rows with a valid target are kept, so the raw file is never held in memory.
+    initial_rows = 0
+    kept = []
+    try:
+        for batch in reader:
+            initial_rows += batch.num_rows
+            table = pa.Table.from_batches([batch])
+            for col in ('registrationDate', 'executionDate'):
+                table = table.set_column(table.schema.get_field_index(col), col, parse_timestamps(table[col]))
+            for col in ('latitude', 'longitude'):
+                table = table.set_column(table.schema.get_field_index(col), col, parse_coordinates(table[col]))
+            days = pc.days_between(table['registrationDate'], table['executionDate'])
+            mask = pc.greater_equal(days, 0)
+            kept.append(table.filter(mask).append_column('days_to_resolve', days.filter(mask)))
+    except Exception as e:
+        print(f"Error loading CSV: {e}")
+        return
+
+    table = pa.concat_tables(kept).combine_chunks()
+    del kept
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+
     print("Data loaded successfully.")
+    print(f"Filtered {initial_rows - len(df)} rows with invalid target values.")
     print("\n--- Initial DataFrame Info ---")
     start_mem = df.memory_usage(deep=True).sum() / 1024**2
     print(f"Initial memory usage: {start_mem:.2f} MB")
     df.info(memory_usage='deep')
 
-    # --- Step 2: Date Conversion ---
-    print("\n--- Processing Dates and Target Variable ---")
-    date_cols = ['registrationDate', 'executionDate']
-    for col in date_cols:
-        if col in df.columns:
-            # Using format='mixed' is computationally expensive but robust to varied date formats
-            df[col] = pd.to_datetime(df[col], format='mixed', errors='coerce')
-        else:
-            print(f"Warning: Date column '{col}' not found in DataFrame.")
-
-    # --- Step 3: Calculate Target Variable ---
-    if 'registrationDate' in df.columns and 'executionDate' in df.columns:
-        df['days_to_resolve'] = (df['executionDate'] - df['registrationDate']).dt.days
-    else:
-        print("Error: Cannot create 'days_to_resolve' as date columns are missing.")
-        df['days_to_resolve'] = np.nan # Create column to avoid subsequent errors
-
-    # --- Step 4: Filter Data ---
-    initial_rows = len(df)
-    df.dropna(subset=['days_to_resolve'], inplace=True)
-    df = df[df['days_to_resolve'] >= 0]
-    print(f"Filtered {initial_rows - len(df)} rows with invalid target values.")
-
-
-    # --- Step 5: Fix Coordinates ---
-    print("\n--- Processing Coordinates ---")
-    coord_cols = ['latitude', 'longitude']
-    for col in coord_cols:
-        if col in df.columns:
-            # Ensure the column is a string before replacing, handle non-string data
-            df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
-        else:
-            print(f"Warning: Coordinate column '{col}' not found.")
-
 
     # --- Step 6: Optimize Other Columns ---
     print("\n--- Optimizing Remaining Columns ---")
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            # Convert object columns with a low ratio of unique values to category
-            num_unique_values = len(df[col].unique())
-            num_total_values = len(df[col])
-            if num_total_values > 0 and num_unique_values / num_total_values < 0.5:
+    if 'district' in df.columns:
+        # The district set is known up front, so pin it instead of keeping the parsed dictionary
+        df['district'] = recode_categories(df['district'], DISTRICT_DTYPE)
+    # Convert object columns with a low ratio of unique values to category.
+    # Below ~1000 rows the categorical overhead outweighs the savings.
+    num_total_values = len(df)
+    if num_total_values >= 1000:
+        for col in df.select_dtypes(include='object').columns:
+            if df[col].nunique(dropna=False) / num_total_values < 0.5:
                 df[col] = df[col].astype('category')
-        elif 'year' in col.lower() and df[col].dtype.kind == 'i':
-            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in df.select_dtypes(include=['integer', 'floating']).columns:
+        df[col] = downcast_numeric(df[col])
 
 
     print("\n--- Final DataFrame Info ---")
@@ -89,9 +186,20 @@ def analyze_and_optimize():
     print(df[existing_verify_cols].head())
 
     # --- Step 8: Save Sample ---
-    print(f"\nSaving 100-row sample to {output_sample_file}...")
+    print(f"\nSaving 100-row sample to {output_sample_file} and {output_parquet_file}...")
     os.makedirs(os.path.dirname(output_sample_file), exist_ok=True)
-    df.head(100).to_csv(output_sample_file, index=False)
+    sample = pa.Table.from_pandas(df.head(100), preserve_index=False)
+    pv.write_csv(sample, output_sample_file, write_options=pv.WriteOptions(include_header=True))
+    # Parquet keeps the optimized dtypes, so downstream loaders skip re-parsing and re-inferring
+    pq.write_table(
+        sample,
+        output_parquet_file,
+        compression='zstd',
+        compression_level=3,
+        use_dictionary=['district', 'category'],
+        write_statistics=True,
+        row_group_size=100000
+    )
     print("Sample saved successfully.")
 
 
@@ -17,21 +17,38 @@ def inspect_database_values():
         with engine.connect() as connection:
             print("Connection successful. Fetching data...")
 
-            # --- Query for Top 20 Categories ---
-            top_categories_query = text("""
-                SELECT category, COUNT(*) as occurrences
-                FROM appeals
-                GROUP BY category
-                ORDER BY occurrences DESC
-                LIMIT 20;
+            # --- Single round-trip for Top 20 Categories and Unique Districts ---
+            # Both result sets come back as tagged rows and are split by 'kind' in Python.
+            combined_query = text("""
+                WITH top_categories AS (
+                    SELECT category AS name, COUNT(*) AS occurrences
+                    FROM appeals
+                    GROUP BY category
+                    ORDER BY occurrences DESC
+                    LIMIT 20
+                ),
+                unique_districts AS (
+                    SELECT DISTINCT district AS name FROM appeals
+                )
+                SELECT 'category' AS kind, name, occurrences FROM top_categories
+                UNION ALL
+                SELECT 'district' AS kind, name, NULL FROM unique_districts;
             """)
-            top_categories_df = pd.read_sql_query(top_categories_query, connection)
+            combined_df = pd.read_sql_query(combined_query, connection)
 
-            # --- Query for Unique Districts ---
-            unique_districts_query = text("""
-                SELECT DISTINCT district FROM appeals;
-            """)
-            unique_districts_df = pd.read_sql_query(unique_districts_query, connection)
+            # UNION ALL does not preserve the CTE ordering, so re-sort the categories here
+            top_categories_df = (
+                combined_df[combined_df['kind'] == 'category']
+                .sort_values('occurrences', ascending=False, kind='stable')
+                .rename(columns={'name': 'category'})[['category', 'occurrences']]
+                .astype({'occurrences': 'int64'})
+                .reset_index(drop=True)
+            )
+            unique_districts_df = (
+                combined_df.loc[combined_df['kind'] == 'district', ['name']]
+                .rename(columns={'name': 'district'})
+                .reset_index(drop=True)
+            )
 
             # --- Display Results ---
             print("\n" + "="*40)
@@ -1,17 +1,17 @@
 import streamlit as st
-import requests
-import pandas as pd
-import json
+import httpx
+import pyarrow as pa
 import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Page Configuration ---
 st.set_page_config(page_title="Lviv City Pulse", page_icon="🏙️", layout="wide")
 
 # --- API Constants ---
 API_BASE_URL = "http://model-api:8000"
-PREDICT_URL = f"{API_BASE_URL}/predict"
-ACTUAL_URL = f"{API_BASE_URL}/actual"
-PERFORMANCE_URL = f"{API_BASE_URL}/performance"
+PREDICT_URL = "/predict"
+ACTUAL_URL = "/actual"
+PERFORMANCE_URL = "/performance"
 
 # --- UI Constants ---
 DISTRICTS = ["Галицький район", "Залізничний район", "Личаківський район", "Сихівський район", "Франківський район", "Шевченківський район"]
@@ -39,6 +39,22 @@ TOP_CATEGORIES = [
 ]
 OTHER_CATEGORY = "Інше (ввести вручну)"
 
+@st.cache_resource
+def get_api_client():
+    """
+    Returns a pooled HTTP client shared across Streamlit reruns,
+    so the connection to the model service is kept alive.
+    """
+    return httpx.Client(base_url=API_BASE_URL, timeout=10.0, limits=httpx.Limits(max_keepalive_connections=8))
+
+def fetch_prediction_and_actual(payload):
+    """Sends the /predict and /actual requests concurrently and returns both responses."""
+    client = get_api_client()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        predict_future = executor.submit(client.post, PREDICT_URL, json=payload)
+        actual_future = executor.submit(client.post, ACTUAL_URL, json=payload)
+        return predict_future.result(), actual_future.result()
+
 def create_gauge_chart(value):
     """Creates a Plotly gauge chart for urgency."""
     fig = go.Figure(go.Indicator(
@@ -81,15 +97,15 @@ def render_prediction_page():
         if not final_category:
             st.warning("Будь ласка, введіть або оберіть категорію."); return
 
-        payload = {"district": district, "category": final_category}
+        # The model service knows the same district list, so a small index is enough on the wire
+        payload = {"district_id": DISTRICTS.index(district), "category": final_category}
         with st.spinner("Отримуємо прогноз..."):
             try:
                 # --- Get Prediction and Actual Case Data ---
-                predict_resp = requests.post(PREDICT_URL, data=json.dumps(payload))
+                predict_resp, actual_resp = fetch_prediction_and_actual(payload)
                 predict_resp.raise_for_status()
                 predictions = predict_resp.json().get("predictions", {})
 
-                actual_resp = requests.post(ACTUAL_URL, data=json.dumps(payload))
                 actual_resp.raise_for_status()
                 actual_days = actual_resp.json().get("actual_days")
 
@@ -117,7 +133,7 @@ def render_prediction_page():
                 gauge_value = predictions.get("XGBoost", 0)
                 st.plotly_chart(create_gauge_chart(gauge_value), use_container_width=True)
 
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 st.error(f"Не вдалося підключитися до сервісу моделей. Перевірте, чи він запущений. Помилка: {e}")
             except Exception as e:
                 st.error(f"Сталася неочікувана помилка: {e}")
@@ -128,14 +144,15 @@ def render_analytics_page():
     st.markdown("Візуалізація порівняння реальних значень та прогнозів моделей на тестовому наборі даних.")
     try:
         with st.spinner("Завантаження даних..."):
-            response = requests.get(PERFORMANCE_URL)
+            response = get_api_client().get(PERFORMANCE_URL)
             response.raise_for_status()
-            df = pd.DataFrame(response.json())
+            # The model service sends the performance table as an Arrow IPC stream
+            df = pa.ipc.open_stream(response.content).read_all().to_pandas(split_blocks=True)
             st.subheader("Порівняння 'Реальність vs. Прогноз'")
             st.line_chart(df)
             st.subheader("Таблиця з даними")
             st.dataframe(df)
-    except requests.exceptions.RequestException:
+    except httpx.HTTPError:
         st.error("Не вдалося завантажити дані. Переконайтеся, що моделі були навчені.")
     except Exception as e:
         st.error(f"Сталася помилка: {e}")
@@ -1,4 +1,6 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Response
+import asyncio
+import pyarrow as pa
 from . import schemas, models
 import os
 
@@ -11,6 +13,59 @@ app = FastAPI(
 # Initialize the ModelManager. It will load artifacts if they exist.
 model_manager = models.ModelManager()
 
+class PredictionBatcher:
+    """
+    Collects concurrent /predict requests for a short window and scores them
+    together, so each model is called once per batch instead of once per request.
+    """
+    def __init__(self, manager: models.ModelManager, window: float = 0.005, max_batch_size: int = 64):
+        self.manager = manager
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    async def predict(self, appeal_input: schemas.AppealInput) -> schemas.PredictionOutput:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # (Re)start the worker on the loop that is serving requests
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        await self._queue.put((appeal_input, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            inputs = [appeal_input for appeal_input, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.manager.predict_batch, inputs)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
+prediction_batcher = PredictionBatcher(model_manager)
+
+
 @app.get("/", tags=["General"])
 def read_root():
     """A simple health check endpoint."""
@@ -37,7 +92,10 @@ async def predict_resolution_time(appeal_input: schemas.AppealInput):
     Predicts the resolution time in days based on appeal details.
     """
     try:
-        predictions = model_manager.predict(appeal_input)
+        # Repeat requests are answered from the manager's cache without waiting for a batch
+        predictions = model_manager.cached_prediction(appeal_input.district, appeal_input.category)
+        if predictions is None:
+            predictions = await prediction_batcher.predict(appeal_input)
         return predictions
     except RuntimeError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -50,9 +108,10 @@ async def get_actual_resolution_time(appeal_input: schemas.AppealInput):
     Fetches a random, real historical case from the DB matching the input criteria.
     """
     try:
-        actual_case = model_manager.get_actual_case(
-            district=appeal_input.district,
-            category=appeal_input.category
+        # The first call reads the whole appeals table, so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        actual_case = await loop.run_in_executor(
+            None, model_manager.get_actual_case, appeal_input.district, appeal_input.category
         )
         return actual_case
     except Exception as e:
@@ -73,11 +132,17 @@ async def get_training_metrics():
 @app.get("/performance", tags=["Metrics"])
 async def get_performance_data():
     """
-    Returns actual vs. predicted data for a sample of the test set.
+    Returns actual vs. predicted data for a sample of the test set,
+    serialized as an Arrow IPC stream.
     """
     try:
         performance_data = model_manager.get_performance()
-        return performance_data
     except RuntimeError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+    table = pa.Table.from_pydict(performance_data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream")
+
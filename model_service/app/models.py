@@ -1,7 +1,11 @@
 import os
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import joblib
 import logging
+from cachetools import LRUCache
 from sqlalchemy import create_engine, text
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
@@ -9,16 +13,56 @@ from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.model_selection import train_test_split
 import numpy as np
+from scipy.sparse import csr_matrix
+from typing import List
+from collections.abc import Mapping
 from . import schemas
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Define paths for saving model artifacts
-MODELS_PATH = "models.joblib"
-COLUMNS_PATH = "model_columns.joblib"
-METRICS_PATH = "metrics.joblib"
-PERFORMANCE_PATH = "performance_data.joblib" # New path for performance data
+# Define paths for saving model artifacts; all of them live in one directory
+ARTIFACTS_DIR = "artifacts"
+# One file per model, so each is only read when it is first used
+MODEL_NAMES = ["LinearRegression", "RandomForest", "XGBoost"]
+MODEL_PATHS = {name: os.path.join(ARTIFACTS_DIR, f"{name}.joblib") for name in MODEL_NAMES}
+COLUMNS_PATH = os.path.join(ARTIFACTS_DIR, "model_columns.joblib")
+METRICS_PATH = os.path.join(ARTIFACTS_DIR, "metrics.joblib")
+PERFORMANCE_PATH = os.path.join(ARTIFACTS_DIR, "performance_data.joblib") # New path for performance data
+
+# Uncompressed, protocol-5 dumps load without a decompression pass
+DUMP_KWARGS = {"compress": 0, "protocol": 5}
+
+def dump_artifact(obj, path: str):
+    """Dumps to a temporary file and renames it, so a reader never sees a half-written artifact."""
+    tmp_path = f"{path}.tmp"
+    joblib.dump(obj, tmp_path, **DUMP_KWARGS)
+    os.replace(tmp_path, path)
+
+class LazyModels(Mapping):
+    """Read-only {name: model} mapping that loads each model file on first access."""
+    def __init__(self, paths: dict):
+        self._paths = paths
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            self._loaded[name] = joblib.load(self._paths[name])
+        return self._loaded[name]
+
+    def unload(self, name):
+        """Drops a loaded model; it is read from disk again if accessed later."""
+        self._loaded.pop(name, None)
+
+    def __contains__(self, name):
+        # Answered from the paths, so membership checks never load a model
+        return name in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
 
 class ModelManager:
     def __init__(self):
@@ -27,78 +71,252 @@ class ModelManager:
         self.model_columns = None
         self.metrics = None
         self.performance_data = None
+        self._col_index = {}
+        self._known_districts = set()
+        self._known_categories = set()
+        self._lr_coef = None
+        self._lr_intercept = 0.0
+        self._tree_tables = {}
+        self._district_pos = {}
+        self._category_pos = {}
+        self._serving_ready = False
+        # (district -> lower-cased category -> days_to_resolve samples), loaded on first use
+        self._actual_cases = None
+        self._actual_matches = LRUCache(maxsize=4096)
+        self._rng = np.random.default_rng()
+        self._actual_lock = threading.Lock()
+        # (district, category) -> PredictionOutput, dropped whenever the models change.
+        # It is shared by the event loop, the batch executor and the /train task, so every
+        # access holds the lock; the generation counts reloads so stale batches are not stored.
+        self._predictions = LRUCache(maxsize=8192)
+        self._predictions_lock = threading.Lock()
+        self._generation = 0
+        self._artifacts_lock = threading.Lock()
         self.load_artifacts()
 
     def load_artifacts(self):
         """Loads all model artifacts from their respective files."""
-        try:
-            if os.path.exists(MODELS_PATH): self.models = joblib.load(MODELS_PATH)
-            if os.path.exists(COLUMNS_PATH): self.model_columns = joblib.load(COLUMNS_PATH)
-            if os.path.exists(METRICS_PATH): self.metrics = joblib.load(METRICS_PATH)
-            if os.path.exists(PERFORMANCE_PATH): self.performance_data = joblib.load(PERFORMANCE_PATH)
-            if self.models and self.model_columns: logging.info("Model artifacts loaded successfully.")
-        except Exception as e:
-            logging.error(f"Error loading artifacts: {e}")
-            # Reset all on failure
-            self.models = self.model_columns = self.metrics = self.performance_data = None
+        # Held across reload and serving preparation, so tables are never built from a mix of artifacts
+        with self._artifacts_lock:
+            with self._predictions_lock:
+                self._predictions.clear()
+                self._generation += 1
+            self._serving_ready = False
+            try:
+                model_paths = {name: path for name, path in MODEL_PATHS.items() if os.path.exists(path)}
+                if model_paths: self.models = LazyModels(model_paths)
+                if os.path.exists(COLUMNS_PATH): self.model_columns = joblib.load(COLUMNS_PATH)
+                if os.path.exists(METRICS_PATH): self.metrics = joblib.load(METRICS_PATH)
+                if os.path.exists(PERFORMANCE_PATH): self.performance_data = joblib.load(PERFORMANCE_PATH)
+                if self.model_columns:
+                    # Maps 'district_<name>' / 'category_<name>' to its position in the feature vector
+                    self._col_index = {col: i for i, col in enumerate(self.model_columns)}
+                    self._known_districts = {col[len("district_"):] for col in self.model_columns if col.startswith("district_")}
+                    self._known_categories = {col[len("category_"):] for col in self.model_columns if col.startswith("category_")}
+                if self.models and self.model_columns:
+                    logging.info("Model artifacts loaded successfully.")
+            except Exception as e:
+                logging.error(f"Error loading artifacts: {e}")
+                # Reset all on failure
+                self.models = self.model_columns = self.metrics = self.performance_data = None
+                self._col_index = {}
+                self._known_districts = set()
+                self._known_categories = set()
+                self._lr_coef = None
+                self._tree_tables = {}
+                self._district_pos = {}
+                self._category_pos = {}
+
+    def _prepare_serving(self):
+        """
+        Precomputes the serving shortcuts on the first prediction. Each model is loaded only
+        to extract its coefficients or table and is unloaded again afterwards.
+        Called with _artifacts_lock held.
+        """
+        self._lr_coef = None
+        if "LinearRegression" in self.models:
+            # A plain dot product skips sklearn's input validation on every request
+            linear_model = self.models["LinearRegression"]
+            self._lr_coef = np.array(linear_model.coef_, dtype=np.float64, copy=True)
+            self._lr_intercept = float(linear_model.intercept_)
+            self.models.unload("LinearRegression")
+        self._build_tree_tables()
+        self._serving_ready = True
+
+    def _build_tree_tables(self):
+        """
+        Evaluates the tree models once over every (district, category) pair and keeps the
+        results as compact float32 tables, so serving becomes an array lookup. The extra
+        last row/column stands for a value unseen in training.
+        """
+        districts = [col[len("district_"):] for col in self.model_columns if col.startswith("district_")]
+        categories = [col[len("category_"):] for col in self.model_columns if col.startswith("category_")]
+        self._district_pos = {district: i for i, district in enumerate(districts)}
+        self._category_pos = {category: j for j, category in enumerate(categories)}
+
+        X_all = np.zeros(((len(districts) + 1) * (len(categories) + 1), len(self.model_columns)), dtype=np.float32)
+        for row, (district, category) in enumerate(itertools.product(districts + [None], categories + [None])):
+            self._encode_row(X_all[row], district, category)
+
+        self._tree_tables = {}
+        for name in ("RandomForest", "XGBoost"):
+            if name in self.models:
+                preds = self._predict_matrix(name, X_all)
+                # The table replaces the model, so the trees need not stay resident
+                self.models.unload(name)
+                self._tree_tables[name] = np.asarray(preds, dtype=np.float32).reshape(len(districts) + 1, len(categories) + 1)
+
+    def _encode_row(self, row: np.ndarray, district, category):
+        """One-hot encodes by setting at most two positions; unknown values leave zeros."""
+        for feature in (f"district_{district}", f"category_{category}"):
+            idx = self._col_index.get(feature)
+            if idx is not None:
+                row[idx] = 1.0
+
+    def _predict_matrix(self, name: str, X: np.ndarray) -> np.ndarray:
+        """Runs one model over an already encoded feature matrix, loading it only if needed."""
+        if name == "LinearRegression" and self._lr_coef is not None:
+            return X @ self._lr_coef + self._lr_intercept
+        model = self.models[name]
+        if isinstance(model, XGBRegressor):
+            # inplace_predict reads the array directly instead of building a DMatrix.
+            # The model is trained on CSR, where absent entries are "missing", so zeros must match.
+            booster = model.get_booster()
+            booster.set_param({"device": "cpu"})
+            return booster.inplace_predict(X, missing=0.0)
+        return model.predict(X)
 
     def train(self):
         """Fetches data, trains models with updated hyperparameters, and saves all artifacts."""
         logging.info("Starting model training with updated hyperparameters...")
         try:
+            # Only the three used columns, with incomplete rows filtered by the database
+            query = text(
+                "SELECT district, category, days_to_resolve FROM appeals "
+                "WHERE days_to_resolve IS NOT NULL AND district IS NOT NULL AND category IS NOT NULL"
+            )
             with self.db_engine.connect() as conn:
-                df = pd.read_sql_query(text("SELECT * FROM appeals"), conn)
+                df = pd.read_sql_query(query, conn)
         except Exception as e:
             logging.error(f"Database connection failed: {e}")
             return
 
-        df.dropna(subset=['days_to_resolve', 'district', 'category'], inplace=True)
-        
-        X = pd.get_dummies(df[['district', 'category']], prefix_sep='_')
-        y = df['days_to_resolve']
+        # One-hot encode straight into CSR from the categorical codes: each row has exactly
+        # two ones, one in the district block and one in the category block.
+        districts = pd.Categorical(df['district'])
+        categories = pd.Categorical(df['category'])
+        n_rows = len(df)
+        indices = np.empty(2 * n_rows, dtype=np.int32)
+        # Codes are int8/int16 for few categories, so widen them before adding the offset
+        indices[0::2] = districts.codes.astype(np.int32)
+        indices[1::2] = len(districts.categories) + categories.codes.astype(np.int32)
+        X = csr_matrix(
+            (np.ones(2 * n_rows, dtype=np.float32), indices, np.arange(0, 2 * n_rows + 1, 2)),
+            shape=(n_rows, len(districts.categories) + len(categories.categories))
+        )
+        # A plain float32 array spares sklearn the Series conversion and dtype checks
+        y = df['days_to_resolve'].to_numpy(dtype=np.float32)
 
-        feature_columns = X.columns.tolist()
-        joblib.dump(feature_columns, COLUMNS_PATH)
+        # Same names and order as pd.get_dummies(prefix_sep='_') produced
+        feature_columns = [f"district_{d}" for d in districts.categories] + [f"category_{c}" for c in categories.categories]
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        dump_artifact(feature_columns, COLUMNS_PATH)
         logging.info(f"Saved {len(feature_columns)} feature columns.")
 
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        # Updated Hyperparameters to combat underfitting
+        # Updated Hyperparameters to combat underfitting.
+        # The forest runs single-threaded because it is fitted alongside XGBoost, which takes every core.
         trained_models = {
             "LinearRegression": LinearRegression(),
-            "RandomForest": RandomForestRegressor(n_estimators=50, max_depth=20, random_state=42, n_jobs=-1),
-            "XGBoost": XGBRegressor(n_estimators=50, max_depth=7, learning_rate=0.1, random_state=42)
+            "RandomForest": RandomForestRegressor(n_estimators=50, max_depth=20, random_state=42, n_jobs=1),
+            # Histogram split finding works directly on the CSR input
+            "XGBoost": XGBRegressor(n_estimators=50, max_depth=7, learning_rate=0.1, tree_method='hist', n_jobs=os.cpu_count(), random_state=42)
         }
         
         calculated_metrics = {"mae": {}, "rmse": {}}
         performance_data = {'Actual': y_test[:100].tolist()} # Use first 100 test samples for visualization
 
+        # All three fits release the GIL, so they overlap in threads instead of running back to back
+        logging.info(f"Training {', '.join(trained_models)}...")
+        with ThreadPoolExecutor(max_workers=len(trained_models)) as executor:
+            fits = [executor.submit(model.fit, X_train, y_train) for model in trained_models.values()]
+            for fit in fits:
+                fit.result()
+
         for name, model in trained_models.items():
-            logging.info(f"Training {name}...")
-            model.fit(X_train, y_train)
             preds = model.predict(X_test)
             
             calculated_metrics["mae"][name] = mean_absolute_error(y_test, preds)
             calculated_metrics["rmse"][name] = np.sqrt(mean_squared_error(y_test, preds))
             performance_data[f"{name}_Pred"] = preds[:100].tolist()
 
-        joblib.dump(trained_models, MODELS_PATH)
-        joblib.dump(calculated_metrics, METRICS_PATH)
-        joblib.dump(performance_data, PERFORMANCE_PATH) # Save performance data
+        for name, model in trained_models.items():
+            dump_artifact(model, MODEL_PATHS[name])
+        dump_artifact(calculated_metrics, METRICS_PATH)
+        dump_artifact(performance_data, PERFORMANCE_PATH) # Save performance data
         logging.info("Model training complete. All artifacts saved.")
         self.load_artifacts()
 
     def predict(self, input_data: schemas.AppealInput) -> schemas.PredictionOutput:
         """Generates predictions, ensuring feature alignment."""
+        return self.predict_batch([input_data])[0]
+
+    def cached_prediction(self, district: str, category: str):
+        """Returns the memoised prediction for (district, category), or None if it was not scored yet."""
+        with self._predictions_lock:
+            return self._predictions.get((district, category))
+
+    def predict_batch(self, inputs: List[schemas.AppealInput]) -> List[schemas.PredictionOutput]:
+        """Scores several inputs with a single call per model."""
         if not self.models or not self.model_columns:
             raise RuntimeError("Models not loaded. Please train first.")
-        
-        input_df = pd.DataFrame([input_data.dict(exclude={'registrationDate'})])
-        input_encoded = pd.get_dummies(input_df, prefix_sep='_')
-        input_aligned = input_encoded.reindex(columns=self.model_columns, fill_value=0)
 
-        predictions = {name: max(0.0, float(model.predict(input_aligned)[0])) for name, model in self.models.items()}
-        return schemas.PredictionOutput(predictions=predictions)
+        # Only (district, category) affects the output, so each distinct pair is scored once
+        keys = [(input_data.district, input_data.category) for input_data in inputs]
+        with self._predictions_lock:
+            results = {key: self._predictions.get(key) for key in keys}
+        missing = [key for key, result in results.items() if result is None]
+        if missing:
+            # A reload cannot swap the artifacts while the batch is prepared and scored
+            with self._artifacts_lock:
+                generation = self._generation
+                if not self.models or not self.model_columns:
+                    raise RuntimeError("Models not loaded. Please train first.")
+                if not self._serving_ready:
+                    self._prepare_serving()
+                scored = dict(zip(missing, self._score(missing)))
+            results.update(scored)
+            with self._predictions_lock:
+                # Results computed with models that were replaced meanwhile are not cached
+                if generation == self._generation:
+                    self._predictions.update(scored)
+        return [results[key] for key in keys]
+
+    def _score(self, keys: List[tuple]) -> List[schemas.PredictionOutput]:
+        """Runs every model over the given (district, category) pairs."""
+        X = np.zeros((len(keys), len(self.model_columns)), dtype=np.float32)
+        for row, (district, category) in enumerate(keys):
+            if district not in self._known_districts and category not in self._known_categories:
+                logging.warning(f"Neither district '{district}' nor category '{category}' was seen in training; the prediction falls back to the baseline.")
+            self._encode_row(X[row], district, category)
+
+        # Values unseen in training map to the last row/column of the tree tables
+        district_pos = np.array([self._district_pos.get(d, len(self._district_pos)) for d, _ in keys], dtype=np.intp)
+        category_pos = np.array([self._category_pos.get(c, len(self._category_pos)) for _, c in keys], dtype=np.intp)
+
+        batch_preds = {}
+        for name in self.models:
+            table = self._tree_tables.get(name)
+            if table is not None:
+                batch_preds[name] = table[district_pos, category_pos]
+            else:
+                batch_preds[name] = self._predict_matrix(name, X)
+
+        return [
+            schemas.PredictionOutput(predictions={name: max(0.0, float(preds[row])) for name, preds in batch_preds.items()})
+            for row in range(len(keys))
+        ]
 
     def get_performance(self) -> dict:
         """Returns the stored performance data for visualization."""
@@ -112,15 +330,39 @@ class ModelManager:
             raise RuntimeError("No metrics found. Please train models first.")
         return schemas.MetricsOutput(mae=self.metrics["mae"], rmse=self.metrics["rmse"])
 
+    def _load_actual_cases(self):
+        """Loads every historical resolution time once, grouped by district and lower-cased category."""
+        query = text('SELECT district, category, days_to_resolve FROM appeals WHERE days_to_resolve IS NOT NULL')
+        with self.db_engine.connect() as conn:
+            df = pd.read_sql_query(query, conn)
+        # Lower-cased in Python so Cyrillic names fold the same way on every database backend
+        df['category'] = df['category'].str.lower()
+        actual_cases = {}
+        for (district, category), days in df.groupby(['district', 'category'])['days_to_resolve']:
+            actual_cases.setdefault(district, {})[category] = days.to_numpy(dtype=np.float32)
+        self._actual_cases = actual_cases
+        self._actual_matches.clear()
+        logging.info(f"Cached historical cases for {len(df)} appeals.")
+
     def get_actual_case(self, district: str, category: str) -> dict:
-        """Queries the DB for a random historical case using fuzzy matching."""
-        cat_pattern = f"%{category}%"
-        try:
-            with self.db_engine.connect() as conn:
-                query = text('SELECT days_to_resolve FROM appeals WHERE district = :district AND category ILIKE :cat_pattern ORDER BY random() LIMIT 1')
-                result = conn.execute(query, {"district": district, "cat_pattern": cat_pattern}).fetchone()
-                return {"actual_days": float(result[0]) if result else None}
-        except Exception as e:
-            logging.error(f"DB query for actual case failed: {e}")
-            return {"actual_days": None}
+        """Picks a random historical case from the in-memory cache using fuzzy matching."""
+        # Runs on executor threads; the lock also makes concurrent first calls load only once
+        with self._actual_lock:
+            if self._actual_cases is None:
+                try:
+                    self._load_actual_cases()
+                except Exception as e:
+                    logging.error(f"DB query for actual cases failed: {e}")
+                    return {"actual_days": None}
+
+            # Same semantics as "category ILIKE '%<category>%'": a case-insensitive substring match
+            key = (district, category.lower())
+            samples = self._actual_matches.get(key)
+            if samples is None:
+                matching = [days for name, days in self._actual_cases.get(district, {}).items() if key[1] in name]
+                samples = np.concatenate(matching) if matching else np.empty(0, dtype=np.float32)
+                self._actual_matches[key] = samples
 
+            if samples.size == 0:
+                return {"actual_days": None}
+            return {"actual_days": float(self._rng.choice(samples))}
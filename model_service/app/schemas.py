@@ -1,16 +1,42 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+
+# Must stay in the same order as DISTRICTS in the Streamlit interface, which sends indices into it
+DISTRICTS = ["Галицький район", "Залізничний район", "Личаківський район", "Сихівський район", "Франківський район", "Шевченківський район"]
 
 class AppealInput(BaseModel):
     """
     Input schema for the prediction endpoint.
+    The district can be given by name or as its index in DISTRICTS.
     Defaults registrationDate to the current time if not provided.
     """
+    model_config = ConfigDict(frozen=True)
+
     district: str
+    district_id: Optional[int] = Field(default=None, ge=0, lt=len(DISTRICTS))
     category: str
     registrationDate: datetime = Field(default_factory=datetime.now)
 
+    @model_validator(mode='before')
+    @classmethod
+    def resolve_district(cls, data):
+        """
+        Maps district_id to the canonical district name before field validation.
+        Giving both district and district_id is only allowed when they agree.
+        """
+        if isinstance(data, dict) and data.get('district_id') is not None:
+            try:
+                index = int(data['district_id'])
+            except (TypeError, ValueError):
+                return data  # reported by the district_id field validation
+            if 0 <= index < len(DISTRICTS):
+                district = data.get('district')
+                if district is not None and district != DISTRICTS[index]:
+                    raise ValueError(f"district '{district}' does not match district_id {index} ('{DISTRICTS[index]}')")
+                data = {**data, 'district': DISTRICTS[index]}
+        return data
+
 class PredictionOutput(BaseModel):
     """
     Output schema for the prediction endpoint.
@@ -1,6 +1,64 @@
 import pandas as pd
 import numpy as np
 import os
+import pyarrow as pa
+from pyarrow import csv as pv
+from numba import njit, prange
+
+# The portal mixes full timestamps and bare dates within the same column
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+# Raw CSV columns used to build the 'appeals' table
+NEEDED_COLS = ['registrationDate', 'executionDate', 'district', 'category', 'latitude', 'longitude']
+# Every column is read as text and converted explicitly below, so skip type inference
+COLUMN_TYPES = {col: pa.string() for col in NEEDED_COLS}
+
+@njit(parallel=True, cache=True)
+def _parse_coordinates(data, offsets, out):
+    """
+    Parses one decimal number per string of an Arrow UTF-8 buffer, where string i
+    spans data[offsets[i]:offsets[i + 1]]. Accepts ',' or '.' as the decimal
+    separator; anything else, including an empty string, yields NaN.
+    """
+    for i in prange(out.shape[0]):
+        mantissa = 0.0
+        frac_digits = 0
+        sign = 1.0
+        seen_digit = False
+        seen_point = False
+        valid = True
+        start = offsets[i]
+        for j in range(start, offsets[i + 1]):
+            c = data[j]
+            if 48 <= c <= 57:
+                mantissa = mantissa * 10.0 + (c - 48)
+                seen_digit = True
+                if seen_point:
+                    frac_digits += 1
+            elif (c == 44 or c == 46) and not seen_point:
+                seen_point = True
+            elif (c == 45 or c == 43) and j == start:
+                sign = -1.0 if c == 45 else 1.0
+            else:
+                valid = False
+                break
+        out[i] = sign * mantissa / 10.0 ** frac_digits if valid and seen_digit else np.nan
+
+def parse_coordinates(arr):
+    """
+    Converts an Arrow string column of coordinates to float64 by running the
+    Numba kernel directly over its offsets and data buffers.
+    """
+    arr = arr.combine_chunks() if isinstance(arr, pa.ChunkedArray) else arr
+    out = np.empty(len(arr), dtype=np.float64)
+    if len(arr) == 0:
+        return out
+    _, offsets_buf, data_buf = arr.buffers()
+    offsets = np.frombuffer(offsets_buf, dtype=np.int32)[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.empty(0, dtype=np.uint8)
+    _parse_coordinates(data, offsets, out)
+    if arr.null_count:
+        out[arr.is_null().to_numpy(zero_copy_only=False)] = np.nan
+    return out
 
 def prepare_data_for_db():
     """
@@ -19,50 +77,71 @@ def prepare_data_for_db():
 
     print(f"Loading data from {input_file}...")
     try:
-        df = pd.read_csv(input_file, sep=';', low_memory=False)
+        # Arrow's multithreaded reader only tokenizes the columns that end up in the table;
+        # any that are missing from the file come back as all-null columns
+        table = pv.read_csv(
+            input_file,
+            parse_options=pv.ParseOptions(delimiter=';'),
+            convert_options=pv.ConvertOptions(
+                include_columns=NEEDED_COLS,
+                include_missing_columns=True,
+                column_types=COLUMN_TYPES,
+                # The portal writes missing values as 'null'
+                strings_can_be_null=True
+            )
+        )
+        # Fix coordinates on the raw Arrow buffers, before any string becomes a Python object
+        for col in ('latitude', 'longitude'):
+            table = table.set_column(table.schema.get_field_index(col), col, pa.array(parse_coordinates(table[col])))
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
     except Exception as e:
         print(f"Error loading CSV: {e}")
         return
 
     print("Processing data...")
-    # Convert dates
+    # Convert dates with literal formats, which take pandas' C parser instead of per-value
+    # inference. Only the values a format rejects are retried with the next one.
     date_cols = ['registrationDate', 'executionDate']
     for col in date_cols:
-        df[col] = pd.to_datetime(df[col], format='mixed', errors='coerce')
+        raw = df[col]
+        parsed = pd.to_datetime(raw, format=DATE_FORMATS[0], errors='coerce', cache=True)
+        for fmt in DATE_FORMATS[1:]:
+            failed = parsed.isna() & raw.notna()
+            if not failed.any():
+                break
+            parsed[failed] = pd.to_datetime(raw[failed], format=fmt, errors='coerce', cache=True)
+        df[col] = parsed
+
+    # Drop unparseable dates first so the target can stay int32 (NaT would force a float upcast)
+    df.dropna(subset=date_cols, inplace=True)
 
-    # Calculate target variable
-    df['days_to_resolve'] = (df['executionDate'] - df['registrationDate']).dt.days
+    # Calculate target variable as whole-day differences in a single NumPy subtraction
+    registration_days = df['registrationDate'].values.astype('datetime64[D]')
+    execution_days = df['executionDate'].values.astype('datetime64[D]')
+    df['days_to_resolve'] = (execution_days - registration_days).astype('int32')
 
     # Filter invalid rows
-    df.dropna(subset=['days_to_resolve'], inplace=True)
     df = df[df['days_to_resolve'] >= 0]
 
-    # Fix coordinates
-    coord_cols = ['latitude', 'longitude']
-    for col in coord_cols:
-        df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
     # Select final columns
     final_cols = [
         'registrationDate', 'executionDate', 'district', 'category',
         'days_to_resolve', 'latitude', 'longitude'
     ]
-    # Ensure all required columns exist, fill missing ones with a default if necessary
-    for col in final_cols:
-        if col not in df.columns:
-            print(f"Warning: Column '{col}' not found. It will be added with null values.")
-            df[col] = np.nan
-
-    df_final = df[final_cols]
-    
-    # Fill any remaining NaNs in key categorical columns to avoid COPY errors
-    df_final['district'].fillna('Unknown', inplace=True)
-    df_final['category'].fillna('Unknown', inplace=True)
+    # Fill any remaining NaNs in key categorical columns to avoid COPY errors.
+    # Done on df itself: filling a df[final_cols] selection would copy the frame first.
+    df.fillna({'district': 'Unknown', 'category': 'Unknown'}, inplace=True)
 
 
     print(f"Saving cleaned data to {output_file}...")
-    df_final.to_csv(output_file, index=False)
+    # Arrow's C++ writer serializes the columns in bulk instead of pandas' row-by-row to_csv.
+    # NaN coordinates become nulls, i.e. empty fields that COPY loads as NULL.
+    table = pa.Table.from_pandas(df, columns=final_cols, preserve_index=False)
+    # Whole seconds, so timestamps are written without pandas' nanosecond fraction
+    for col in date_cols:
+        table = table.set_column(table.schema.get_field_index(col), col, table[col].cast(pa.timestamp('s')))
+    pv.write_csv(table, output_file, write_options=pv.WriteOptions(include_header=True))
     print("Data preparation complete.")
 
 if __name__ == "__main__":